@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Audio Tools
+Small ffmpeg/ffprobe helpers shared by the downloader and the MP3 processor
+"""
+
+import json
+import re
+import shutil
+import subprocess
+
+LOUDNESS_RE = re.compile(r"I:\s+(-?[\d.]+) LUFS")
+
+
+def has_ffmpeg():
+    """Check if ffmpeg and ffprobe are on PATH"""
+    return shutil.which("ffmpeg") is not None and shutil.which("ffprobe") is not None
+
+
+def probe_audio(path):
+    """Return duration (seconds), bitrate (kbps) and tags of an audio file"""
+    cmd = [
+        "ffprobe", "-v", "error",
+        "-print_format", "json",
+        "-show_format",
+        "-select_streams", "a:0", "-show_streams",
+        str(path)
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+    info = json.loads(result.stdout or "{}")
+    fmt = info.get("format", {})
+    streams = info.get("streams") or [{}]
+
+    duration = float(fmt.get("duration") or streams[0].get("duration") or 0)
+    bit_rate = streams[0].get("bit_rate") or fmt.get("bit_rate") or 0
+
+    return {
+        "duration": duration,
+        "bitrate": int(bit_rate) // 1000,
+        "tags": {k.lower(): v for k, v in fmt.get("tags", {}).items()},
+    }
+
+
+def measure_loudness(path):
+    """Return integrated loudness in LUFS (ffmpeg ebur128), or None if unknown"""
+    cmd = [
+        "ffmpeg", "-hide_banner", "-nostats",
+        "-i", str(path),
+        "-map", "0:a", "-af", "ebur128",
+        "-f", "null", "-"
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    # The last "I:" value is the summary; earlier ones are per-frame readings
+    matches = LOUDNESS_RE.findall(result.stderr)
+    return float(matches[-1]) if matches else None
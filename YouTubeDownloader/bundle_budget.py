@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Bundle Budget Optimizer
+Picks per-track MP3 bitrates so each music category fits a byte budget,
+then transcodes the affected tracks in parallel with ffmpeg.
+"""
+
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from audio_tools import measure_loudness, probe_audio
+
+# Target bitrates a track can be stepped down through (kbps)
+BITRATE_LADDER = [320, 256, 192, 160, 128, 112, 96, 64]
+
+# Steps that save less than this are not worth a re-encode (kbps)
+MIN_STEP_KBPS = 16
+
+# How strongly track length protects a track from being stepped down (0-1)
+DURATION_PROTECTION = 0.5
+
+# Integrated loudness keyed by (path, size, mtime), so a full ebur128 decode
+# only happens once per file version
+loudness_cache = {}
+
+
+def audio_bytes(duration, kbps):
+    """Size of the audio payload for duration seconds at kbps"""
+    return int(duration * kbps * 1000 / 8)
+
+
+def category_files(category_dir):
+    """MP3 files directly inside a category folder"""
+    return sorted(p for p in Path(category_dir).iterdir()
+                  if p.is_file() and p.suffix.lower() == '.mp3')
+
+
+def scan_track(path):
+    """Collect duration, bitrate, loudness, size and mtime for one track"""
+    path = Path(path)
+    info = probe_audio(path)
+    stat = path.stat()
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    if key not in loudness_cache:
+        loudness_cache[key] = measure_loudness(path)
+    return {
+        "path": path,
+        "duration": info["duration"],
+        "bitrate": info["bitrate"],
+        "loudness": loudness_cache[key],
+        "size": stat.st_size,
+        "mtime": stat.st_mtime_ns,
+    }
+
+
+def scan_tracks(files, max_workers=None, log=None):
+    """Scan tracks in parallel, preserving input order
+
+    Files that cannot be probed (corrupt or half-written) are logged and
+    left out of the result.
+    """
+    log = log or (lambda message: None)
+
+    def scan(path):
+        try:
+            return scan_track(path)
+        except Exception as e:
+            log(f"  ⚠️ 跳过无法读取的文件 {Path(path).name}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as pool:
+        return [track for track in pool.map(scan, files) if track is not None]
+
+
+def projected_size(track, kbps):
+    """Estimated file size after transcoding track to kbps"""
+    # Keep whatever the file carries besides audio (ID3 tags, cover art)
+    overhead = max(0, track["size"] - audio_bytes(track["duration"], track["bitrate"]))
+    return overhead + audio_bytes(track["duration"], kbps)
+
+
+def plan_category(tracks, budget):
+    """Choose target bitrates so the tracks fit within budget bytes
+
+    Tracks start at their current bitrate and are stepped down the ladder
+    one rung at a time until the category fits. Each step goes to the track
+    with the highest bitrate after a discount for length, so short tracks
+    give up quality before long ones. A second pass then raises tracks back
+    up, longest first, as far as the budget allows, so no track is lowered
+    further than needed. Loudness is reported per track but does not change
+    the plan.
+
+    If the budget is out of reach even with every track at the lowest
+    rung, nothing is changed and the plan only reports minimum_total.
+
+    >>> mib = 1024 * 1024
+    >>> def track(name, minutes, kbps):
+    ...     size = audio_bytes(minutes * 60, kbps)
+    ...     return {"path": Path(name), "duration": minutes * 60, "bitrate": kbps,
+    ...             "loudness": None, "size": size, "mtime": 0}
+    >>> plan = plan_category([track("long.mp3", 60, 320), track("short.mp3", 3, 320),
+    ...                       track("mid.mp3", 10, 192)], 120 * mib)
+    >>> [(t["path"].name, t["target"]) for t in plan["tracks"]]
+    [('long.mp3', 192), ('short.mp3', None), ('mid.mp3', None)]
+    >>> plan["fits"], round(plan["projected_total"] / mib)
+    (True, 103)
+    """
+    entries = []
+    for track in tracks:
+        options = [track["bitrate"]] + [k for k in BITRATE_LADDER
+                                        if k <= track["bitrate"] - MIN_STEP_KBPS]
+        entries.append(dict(track, options=options, level=0))
+
+    longest = max((e["duration"] for e in entries), default=0) or 1
+
+    def current_size(entry):
+        if entry["level"] == 0:
+            return entry["size"]
+        return projected_size(entry, entry["options"][entry["level"]])
+
+    def step_key(entry):
+        kbps = entry["options"][entry["level"]]
+        return kbps * (1 - DURATION_PROTECTION * entry["duration"] / longest)
+
+    total = sum(current_size(e) for e in entries)
+    minimum_total = sum(e["size"] if len(e["options"]) == 1 else projected_size(e, e["options"][-1])
+                        for e in entries)
+    while total > budget and minimum_total <= budget:
+        candidates = [e for e in entries if e["level"] < len(e["options"]) - 1]
+        if not candidates:
+            break
+        entry = max(candidates, key=step_key)
+        before = current_size(entry)
+        entry["level"] += 1
+        total += current_size(entry) - before
+
+    # Undo steps that turned out to be unnecessary, most protected track first
+    for entry in sorted(entries, key=lambda e: -e["duration"]):
+        while entry["level"] > 0:
+            before = current_size(entry)
+            entry["level"] -= 1
+            if total + current_size(entry) - before > budget:
+                entry["level"] += 1
+                break
+            total += current_size(entry) - before
+
+    plan_tracks = []
+    for entry in entries:
+        plan_tracks.append({
+            "path": entry["path"],
+            "duration": entry["duration"],
+            "bitrate": entry["bitrate"],
+            "loudness": entry["loudness"],
+            "size": entry["size"],
+            "mtime": entry["mtime"],
+            "target": entry["options"][entry["level"]] if entry["level"] else None,
+            "projected": current_size(entry),
+        })
+
+    return {
+        "budget": budget,
+        "current_total": sum(t["size"] for t in plan_tracks),
+        "projected_total": total,
+        "minimum_total": minimum_total,
+        "fits": total <= budget,
+        "tracks": plan_tracks,
+    }
+
+
+def plan_budgets(music_dir, budgets, max_workers=None, log=None):
+    """Build a plan for each category in budgets ({category: bytes})"""
+    plans = {}
+    for category, budget in budgets.items():
+        tracks = scan_tracks(category_files(Path(music_dir) / category), max_workers, log)
+        plans[category] = plan_category(tracks, budget)
+    return plans
+
+
+def transcode(path, kbps):
+    """Re-encode path in place at kbps, keeping its tags and cover art"""
+    path = Path(path)
+    tmp = path.with_name(path.name + ".part")
+    cmd = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+        "-i", str(path),
+        "-map", "0:a", "-map", "0:v?", "-c:v", "copy",
+        "-c:a", "libmp3lame", "-b:a", f"{kbps}k",
+        "-map_metadata", "0", "-id3v2_version", "3",
+        "-f", "mp3", str(tmp)
+    ]
+    try:
+        subprocess.run(cmd, capture_output=True, text=True, check=True)
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+def execute_plan(plan, max_workers=None, log=None):
+    """Transcode every track with a target bitrate; returns (done, errors)
+
+    Plans that do not fit their budget are skipped rather than re-encoded
+    for no gain, as are tracks whose file changed since it was scanned.
+    """
+    log = log or (lambda message: None)
+    if not plan["fits"]:
+        log("  ⚠️ 计划超出预算，跳过")
+        return 0, 0
+    jobs = [t for t in plan["tracks"] if t["target"]]
+
+    def run(track):
+        try:
+            stat = track["path"].stat()
+            if (stat.st_size, stat.st_mtime_ns) != (track["size"], track["mtime"]):
+                log(f"  ⚠️ 文件已变化，跳过 {track['path'].name}")
+                return False
+            transcode(track["path"], track["target"])
+            log(f"  ✅ {track['path'].name}: {track['bitrate']} → {track['target']} kbps")
+            return True
+        except Exception as e:
+            log(f"  ❌ 转码失败 {track['path'].name}: {e}")
+            return False
+
+    with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as pool:
+        results = list(pool.map(run, jobs))
+    return results.count(True), results.count(False)
+
+
+def format_size(size):
+    """Human readable size in MB"""
+    return f"{size / (1024 * 1024):.1f} MB"
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Mix Splitter
+Splits long lofi mixes into per-track MP3 files with ffmpeg stream copy.
+Uses the video's chapter list when available, otherwise silence detection.
+"""
+
+import os
+import re
+import subprocess
+from pathlib import Path
+
+from audio_tools import probe_audio
+
+# Only files at least this long are treated as mixes (seconds)
+MIN_MIX_DURATION = 20 * 60
+
+# Chapters shorter than this are merged into a neighbour, and silence cuts
+# that would leave a segment this short are skipped (seconds)
+MIN_SEGMENT_DURATION = 60
+
+SILENCE_RE = re.compile(r"silence_(start|end):\s*(-?[\d.]+)")
+
+
+def chapter_segments(chapters, duration, min_segment=MIN_SEGMENT_DURATION):
+    """Convert yt-dlp chapter dicts into (start, end, title) tuples
+
+    Chapters shorter than min_segment (intros, outros) are folded into the
+    previous chapter, or into the next one when they come first.
+    """
+    segments = []
+    for i, chapter in enumerate(chapters or [], 1):
+        start = min(float(chapter.get("start_time") or 0), duration)
+        end = min(float(chapter.get("end_time") or duration), duration)
+        title = (chapter.get("title") or "").strip() or f"Part {i}"
+        if end > start:
+            segments.append((start, end, title))
+
+    merged = []
+    carry = None  # start of a short leading chapter waiting for the next one
+    for start, end, title in segments:
+        if carry is not None:
+            start, carry = carry, None
+        if end - start >= min_segment:
+            merged.append((start, end, title))
+        elif merged:
+            prev_start, _, prev_title = merged[-1]
+            merged[-1] = (prev_start, end, prev_title)
+        else:
+            carry = start
+    if carry is not None:
+        merged.append((carry, segments[-1][1], segments[-1][2]))
+    return merged
+
+
+def detect_silences(path, noise_db=-35, min_silence=2.0):
+    """Return (start, end) pairs of silent stretches found by ffmpeg silencedetect"""
+    cmd = [
+        "ffmpeg", "-hide_banner", "-nostats",
+        "-i", str(path),
+        "-af", f"silencedetect=noise={noise_db}dB:d={min_silence}",
+        "-f", "null", "-"
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+
+    silences = []
+    start = None
+    for kind, value in SILENCE_RE.findall(result.stderr):
+        if kind == "start":
+            start = float(value)
+        elif start is not None:
+            silences.append((max(start, 0.0), float(value)))
+            start = None
+    return silences
+
+
+def silence_segments(silences, duration, min_segment=MIN_SEGMENT_DURATION):
+    """Cut at the middle of each silence, skipping cuts that leave tiny segments"""
+    cuts = [0.0]
+    for start, end in silences:
+        cut = (start + end) / 2
+        if cut - cuts[-1] >= min_segment and duration - cut >= min_segment:
+            cuts.append(cut)
+    cuts.append(duration)
+
+    return [(cuts[i], cuts[i + 1], f"Part {i + 1}") for i in range(len(cuts) - 1)]
+
+
+def split_artist_title(chapter_title, fallback_artist=None):
+    """Split an "Artist - Track" chapter title into (artist, title)
+
+    Titles without that form keep the fallback artist (usually the uploader).
+    """
+    artist, sep, title = chapter_title.partition(" - ")
+    if sep and artist.strip() and title.strip():
+        return artist.strip(), title.strip()
+    return fallback_artist, chapter_title
+
+
+def safe_name(text):
+    """Make a chapter title usable in a file name"""
+    text = re.sub(r'[^\w\s\-.]', '', text)
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text or "Untitled"
+
+
+def copy_segment(src, dest, start, end, tags):
+    """Cut [start, end) out of src into dest without re-encoding"""
+    # Write under a .part name so a half-written segment never looks like a track
+    tmp = dest.with_name(dest.name + ".part")
+    cmd = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+        "-ss", f"{start:.3f}", "-t", f"{end - start:.3f}",
+        "-i", str(src),
+        "-map", "0:a", "-c", "copy",
+        "-map_metadata", "0", "-map_chapters", "-1",
+    ]
+    for key, value in tags.items():
+        if value:
+            cmd.extend(["-metadata", f"{key}={value}"])
+    cmd.extend(["-id3v2_version", "3", "-f", "mp3", str(tmp)])
+
+    try:
+        subprocess.run(cmd, capture_output=True, text=True, check=True)
+        os.replace(tmp, dest)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+def split_mix(path, chapters=None, title=None, artist=None,
+              min_duration=MIN_MIX_DURATION, keep_original=False, log=None):
+    """Split a downloaded mix into tracks next to it
+
+    Returns the list of created files, or an empty list when the file is
+    too short to be a mix or no split points were found.
+    """
+    log = log or (lambda message: None)
+    path = Path(path)
+    duration = probe_audio(path)["duration"]
+    if duration < min_duration:
+        return []
+
+    segments = chapter_segments(chapters, duration)
+    source = "章节"
+    if len(segments) < 2:
+        log(f"  🔇 无章节信息，使用静音检测: {path.name}")
+        segments = silence_segments(detect_silences(path), duration)
+        source = "静音检测"
+    if len(segments) < 2:
+        log(f"  ⚠️ 未找到分割点，保留完整文件: {path.name}")
+        return []
+
+    album = title or path.stem
+    stem = safe_name(path.stem)
+    total = len(segments)
+    created = []
+    try:
+        for i, (start, end, seg_title) in enumerate(segments, 1):
+            dest = path.with_name(f"{stem} - {i:02d} - {safe_name(seg_title)}.mp3")
+            seg_artist, track_title = split_artist_title(seg_title, artist)
+            tags = {
+                "title": track_title,
+                "artist": seg_artist,
+                "album": album,
+                "track": f"{i}/{total}",
+            }
+            copy_segment(path, dest, start, end, tags)
+            created.append(dest)
+    except Exception:
+        # Don't leave a half-split mix next to the original
+        for dest in created:
+            dest.unlink()
+        raise
+
+    log(f"  ✂️ 按{source}拆分为 {total} 首: {path.name}")
+    if not keep_original:
+        path.unlink()
+    return created
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Music Folder Watcher
+Watches the music directory for new MP3 files and hands settled files to a
+bounded work queue. Uses inotify on Linux and falls back to polling elsewhere.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import queue
+import select
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+
+# inotify event masks (see <sys/inotify.h>)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0x00000800
+IN_CLOEXEC = 0x00080000
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+
+EVENT_HEADER = struct.Struct("iIII")
+
+# Suffixes yt-dlp and ffmpeg use while a file is still being written
+TEMP_SUFFIXES = ('.part', '.ytdl', '.temp.mp3', '.tmp')
+
+
+def is_temp_file(path):
+    """Check whether a path is a partially written download"""
+    name = path.name.lower()
+    return name.endswith(TEMP_SUFFIXES) or '.part-frag' in name
+
+
+def is_audio_candidate(path):
+    """Check whether a path is a finished MP3 worth processing"""
+    return path.suffix.lower() == '.mp3' and not path.name.startswith('.') and not is_temp_file(path)
+
+
+def has_pending_download(path):
+    """Check whether yt-dlp still has temp files next to this track"""
+    stem = path.name[:-len(path.suffix)]
+    try:
+        for sibling in path.parent.iterdir():
+            if sibling != path and sibling.name.startswith(stem) and is_temp_file(sibling):
+                return True
+    except OSError:
+        return False
+    return False
+
+
+class InotifyBackend:
+    """Linux inotify event source for a directory tree"""
+
+    def __init__(self, root_dir):
+        libc_name = ctypes.util.find_library("c")
+        if not sys.platform.startswith("linux") or not libc_name:
+            raise OSError("inotify 不可用")
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self.libc, "inotify_init1"):
+            raise OSError("inotify 不可用")
+
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+
+        self.root_dir = root_dir
+        self.watches = {}
+        self.add_tree(root_dir)
+
+    def add_tree(self, directory):
+        """Watch a directory and all of its sub-directories"""
+        for root, dirs, files in os.walk(directory):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            self.add_watch(Path(root))
+
+    def add_watch(self, directory):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(str(directory)), WATCH_MASK)
+        if wd >= 0:
+            self.watches[wd] = directory
+
+    def read_events(self, timeout):
+        """Return (changed paths, overflowed) observed within timeout seconds"""
+        changed = []
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return changed, False
+
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return changed, False
+
+        overflowed = False
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                overflowed = True
+                continue
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+
+            directory = self.watches.get(wd)
+            if directory is None or not name:
+                continue
+
+            path = directory / os.fsdecode(name)
+            if mask & IN_ISDIR:
+                # New category folder: start watching it and pick up anything already inside
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self.add_tree(path)
+                    changed.extend(p for p in path.rglob("*.mp3") if p.is_file())
+                continue
+            changed.append(path)
+
+        return changed, overflowed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PollingBackend:
+    """Fallback event source that compares directory snapshots"""
+
+    def __init__(self, root_dir, interval=1.0):
+        self.root_dir = root_dir
+        self.interval = interval
+        self.snapshot = self.take_snapshot()
+
+    def take_snapshot(self):
+        snapshot = {}
+        for root, dirs, files in os.walk(self.root_dir):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            for file in files:
+                path = Path(root) / file
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                snapshot[path] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+    def read_events(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        current = self.take_snapshot()
+        changed = [path for path, state in current.items() if self.snapshot.get(path) != state]
+        self.snapshot = current
+        return changed, False
+
+    def close(self):
+        pass
+
+
+class MusicFolderWatcher:
+    """Debounces file events and feeds settled MP3 paths into a bounded queue
+
+    Consumers call get_batch() from their own thread. When the queue is full
+    settled files stay in the pending table and are retried on the next tick;
+    the watcher keeps reading events meanwhile, so nothing is dropped and
+    repeated events for a file coalesce into one entry.
+    """
+
+    def __init__(self, root_dir, queue_size=16, settle_seconds=2.0,
+                 poll_interval=1.0, use_inotify=True, log=None):
+        self.root_dir = Path(root_dir)
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.log = log or (lambda message: None)
+
+        self.work_queue = queue.Queue(maxsize=queue_size)
+        self.pending = {}
+        self.backend = None
+        self.backend_name = None
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """Start watching in a background thread"""
+        self.backend = None
+        if self.use_inotify:
+            try:
+                self.backend = InotifyBackend(self.root_dir)
+                self.backend_name = "inotify"
+            except OSError as e:
+                self.log(f"⚠️ inotify 不可用，改用轮询: {e}")
+        if self.backend is None:
+            self.backend = PollingBackend(self.root_dir, self.poll_interval)
+            self.backend_name = "polling"
+
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop watching and wait for the background thread to exit"""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+            self.thread = None
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def run(self):
+        try:
+            while not self.stop_event.is_set():
+                changed, overflowed = self.backend.read_events(self.poll_interval)
+                now = time.monotonic()
+                if overflowed:
+                    # The kernel dropped events, so fall back to a one-off rescan
+                    self.log("⚠️ 事件队列溢出，重新扫描文件夹")
+                    changed = [p for p in self.root_dir.rglob("*.mp3") if p.is_file()]
+                for path in changed:
+                    if is_audio_candidate(path):
+                        self.mark_pending(path, now)
+                self.flush_settled(now)
+        finally:
+            self.backend.close()
+
+    def mark_pending(self, path, now):
+        """Record an event for path, resetting its debounce timer"""
+        self.pending[path] = (now, self.file_state(path))
+
+    def file_state(self, path):
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        return (stat.st_size, stat.st_mtime_ns)
+
+    def flush_settled(self, now):
+        """Move files that stopped changing into the work queue"""
+        for path, (last_event, last_state) in list(self.pending.items()):
+            if now - last_event < self.settle_seconds:
+                continue
+
+            state = self.file_state(path)
+            if state is None:
+                # Deleted or renamed before it settled
+                del self.pending[path]
+                continue
+            if state != last_state or has_pending_download(path):
+                self.pending[path] = (now, state)
+                continue
+
+            try:
+                self.work_queue.put_nowait(path)
+            except queue.Full:
+                # Consumer is busy: keep the rest pending and retry next tick
+                return
+            del self.pending[path]
+
+    def get_batch(self, max_items=None, timeout=0.5):
+        """Wait for settled paths and return them as a de-duplicated list"""
+        try:
+            first = self.work_queue.get(timeout=timeout)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        while max_items is None or len(batch) < max_items:
+            try:
+                path = self.work_queue.get_nowait()
+            except queue.Empty:
+                break
+            if path not in batch:
+                batch.append(path)
+        return batch
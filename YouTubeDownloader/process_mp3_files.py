@@ -15,14 +15,29 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import threading
 
+from audio_tools import has_ffmpeg
+from bundle_budget import execute_plan, format_size, plan_budgets
+from music_watcher import MusicFolderWatcher
+
 class MP3Processor:
     def __init__(self, root):
         self.root = root
         self.root.title("MP3 文件批量处理器")
-        self.root.geometry("700x500")
+        self.root.geometry("750x600")
+        
+        # Default to the app's music directory when it exists
+        script_dir = Path(__file__).parent.absolute()
+        music_dir = script_dir.parent / "LofiTimer" / "Resources" / "Audio" / "music"
+        self.current_dir = music_dir if music_dir.exists() else script_dir
+        
+        # Active watch-mode watcher, if any
+        self.watcher = None
         
-        # Get current directory (nujabes folder)
-        self.current_dir = Path(__file__).parent.absolute()
+        # Latest bundle budget plans, keyed by category
+        self.budget_plans = {}
+        
+        # Job currently touching the source folder ("process", "watch", "plan", "execute")
+        self.active_job = None
         
         self.create_widgets()
     
@@ -79,6 +94,28 @@ class MP3Processor:
         quality_combo.pack(side=tk.LEFT, padx=(5, 2))
         ttk.Label(quality_frame, text="kbps").pack(side=tk.LEFT)
         
+        # Bundle size budget
+        budget_frame = ttk.LabelFrame(main_frame, text="按类别预算优化 (需要 ffmpeg)", padding="10")
+        budget_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        ttk.Label(budget_frame, text="类别:").pack(side=tk.LEFT)
+        self.budget_category = tk.StringVar(value="全部")
+        self.budget_category_combo = ttk.Combobox(budget_frame, textvariable=self.budget_category,
+                                                  state="readonly", width=12,
+                                                  postcommand=self.load_budget_categories)
+        self.budget_category_combo.pack(side=tk.LEFT, padx=(5, 10))
+        
+        ttk.Label(budget_frame, text="每类别预算:").pack(side=tk.LEFT)
+        self.budget_mb = tk.StringVar(value="20")
+        ttk.Entry(budget_frame, textvariable=self.budget_mb, width=8).pack(side=tk.LEFT, padx=(5, 2))
+        ttk.Label(budget_frame, text="MB").pack(side=tk.LEFT)
+        
+        self.execute_budget_btn = ttk.Button(budget_frame, text="执行计划", command=self.start_budget_execute,
+                                             state="disabled")
+        self.execute_budget_btn.pack(side=tk.RIGHT, padx=(5, 0))
+        self.plan_budget_btn = ttk.Button(budget_frame, text="生成计划", command=self.start_budget_plan)
+        self.plan_budget_btn.pack(side=tk.RIGHT)
+        
         # Control buttons
         control_frame = ttk.Frame(main_frame)
         control_frame.pack(pady=20)
@@ -87,6 +124,10 @@ class MP3Processor:
         self.process_btn.pack(side=tk.LEFT, padx=5)
         
         ttk.Button(control_frame, text="预览更改", command=self.preview_changes).pack(side=tk.LEFT, padx=5)
+        
+        self.watch_btn = ttk.Button(control_frame, text="监视文件夹", command=self.toggle_watch)
+        self.watch_btn.pack(side=tk.LEFT, padx=5)
+        
         ttk.Button(control_frame, text="打开文件夹", command=self.open_folder).pack(side=tk.LEFT, padx=5)
         
         # Progress
@@ -214,11 +255,14 @@ class MP3Processor:
             messagebox.showerror("错误", "源文件夹不存在")
             return
         
+        if self.active_job is not None:
+            return
+        
         # Confirm before processing
         if not messagebox.askyesno("确认", "确定要开始处理 MP3 文件吗？建议先备份重要文件。"):
             return
         
-        self.process_btn.config(state="disabled")
+        self.set_active_job("process")
         self.progress_var.set("处理中...")
         self.log_text.delete(1.0, tk.END)
         
@@ -239,66 +283,7 @@ class MP3Processor:
             
             self.root.after(0, lambda: self.log(f"🎵 开始处理 {total_files} 个 MP3 文件"))
             
-            processed = 0
-            errors = 0
-            
-            # Step 1: Normalize filenames
-            if self.normalize_names.get():
-                self.root.after(0, lambda: self.log("\n📝 标准化文件名..."))
-                for i, mp3_file in enumerate(mp3_files):
-                    try:
-                        new_name = self.normalize_filename(mp3_file)
-                        if mp3_file.name != new_name:
-                            new_path = mp3_file.parent / new_name
-                            # Avoid overwriting existing files
-                            counter = 1
-                            while new_path.exists() and new_path != mp3_file:
-                                name_part = new_name.rsplit('.', 1)[0]
-                                new_path = mp3_file.parent / f"{name_part}_{counter}.mp3"
-                                counter += 1
-                            
-                            mp3_file.rename(new_path)
-                            mp3_files[i] = new_path  # Update reference
-                            self.root.after(0, lambda o=mp3_file.name, n=new_path.name: 
-                                          self.log(f"  ✅ {o} → {n}"))
-                        processed += 1
-                    except Exception as e:
-                        errors += 1
-                        self.root.after(0, lambda f=mp3_file.name, e=str(e): 
-                                      self.log(f"  ❌ 重命名失败 {f}: {e}"))
-            
-            # Step 2: Remove duplicates (simple implementation)
-            if self.remove_duplicates.get():
-                self.root.after(0, lambda: self.log("\n🔍 检查重复文件..."))
-                seen_sizes = {}
-                duplicates = []
-                
-                for mp3_file in mp3_files:
-                    try:
-                        size = mp3_file.stat().st_size
-                        if size in seen_sizes:
-                            duplicates.append(mp3_file)
-                            self.root.after(0, lambda f=mp3_file.name: 
-                                          self.log(f"  🗑️ 发现重复文件: {f}"))
-                        else:
-                            seen_sizes[size] = mp3_file
-                    except Exception as e:
-                        self.root.after(0, lambda f=mp3_file.name, e=str(e): 
-                                      self.log(f"  ❌ 检查文件失败 {f}: {e}"))
-                
-                # Remove duplicates
-                for dup_file in duplicates:
-                    try:
-                        dup_file.unlink()
-                        self.root.after(0, lambda f=dup_file.name: 
-                                      self.log(f"  ✅ 删除重复文件: {f}"))
-                    except Exception as e:
-                        errors += 1
-                        self.root.after(0, lambda f=dup_file.name, e=str(e): 
-                                      self.log(f"  ❌ 删除失败 {f}: {e}"))
-            
-            # Additional processing steps would go here (metadata, volume, quality)
-            # These would require additional dependencies like mutagen, ffmpeg, etc.
+            processed, errors = self.run_stages(mp3_files, {})
             
             self.root.after(0, lambda: self.progress_var.set(f"完成! 处理: {processed}, 错误: {errors}"))
             self.root.after(0, lambda: self.log(f"\n🎉 处理完成! 处理: {processed}, 错误: {errors}"))
@@ -306,7 +291,305 @@ class MP3Processor:
         except Exception as e:
             self.root.after(0, lambda e=str(e): self.log(f"❌ 处理过程中发生错误: {e}"))
         finally:
-            self.root.after(0, lambda: self.process_btn.config(state="normal"))
+            self.root.after(0, self.set_active_job, None)
+
+    def set_active_job(self, job):
+        """Record the running job and disable the controls of all others
+
+        Manual processing, watch mode and budget transcodes all rename or
+        rewrite files in the source folder, so only one may run at a time.
+        """
+        self.active_job = job
+        if job in ("process", "watch"):
+            # These jobs rename and delete files, so earlier plans go stale
+            self.budget_plans = {}
+        idle = "normal" if job is None else "disabled"
+        self.process_btn.config(state=idle)
+        self.plan_budget_btn.config(state=idle)
+        self.watch_btn.config(state="normal" if job in (None, "watch") else "disabled")
+        ready = job is None and self.budget_plan_ready()
+        self.execute_budget_btn.config(state="normal" if ready else "disabled")
+
+    def run_stages(self, mp3_files, seen_sizes, protected=None, renamed=None):
+        """Run the enabled processing stages on the given files
+
+        seen_sizes maps file size to an already kept file and is updated in
+        place, so watch mode can check new files against earlier ones.
+        Files in protected are never deleted as duplicates, and the new path
+        of every renamed file is added to renamed when it is given.
+        """
+        mp3_files = list(mp3_files)
+        protected = protected if protected is not None else set()
+        processed = 0
+        errors = 0
+
+        # Step 1: Normalize filenames
+        if self.normalize_names.get():
+            self.root.after(0, lambda: self.log("\n📝 标准化文件名..."))
+            for i, mp3_file in enumerate(mp3_files):
+                try:
+                    new_name = self.normalize_filename(mp3_file)
+                    if mp3_file.name != new_name:
+                        new_path = mp3_file.parent / new_name
+                        # Avoid overwriting existing files
+                        counter = 1
+                        while new_path.exists() and new_path != mp3_file:
+                            name_part = new_name.rsplit('.', 1)[0]
+                            new_path = mp3_file.parent / f"{name_part}_{counter}.mp3"
+                            counter += 1
+
+                        mp3_file.rename(new_path)
+                        mp3_files[i] = new_path  # Update reference
+                        if renamed is not None:
+                            renamed.add(new_path)
+                        if mp3_file in protected:
+                            protected.add(new_path)
+                        self.root.after(0, lambda o=mp3_file.name, n=new_path.name:
+                                      self.log(f"  ✅ {o} → {n}"))
+                    processed += 1
+                except Exception as e:
+                    errors += 1
+                    self.root.after(0, lambda f=mp3_file.name, e=str(e):
+                                  self.log(f"  ❌ 重命名失败 {f}: {e}"))
+
+        # Step 2: Remove duplicates (simple implementation)
+        if self.remove_duplicates.get():
+            self.root.after(0, lambda: self.log("\n🔍 检查重复文件..."))
+            duplicates = []
+
+            for mp3_file in mp3_files:
+                if mp3_file in protected:
+                    continue
+                try:
+                    size = mp3_file.stat().st_size
+                    kept = seen_sizes.get(size)
+                    if kept is not None and kept != mp3_file and self.same_size(kept, size):
+                        duplicates.append(mp3_file)
+                        self.root.after(0, lambda f=mp3_file.name:
+                                      self.log(f"  🗑️ 发现重复文件: {f}"))
+                    else:
+                        seen_sizes[size] = mp3_file
+                except Exception as e:
+                    self.root.after(0, lambda f=mp3_file.name, e=str(e):
+                                  self.log(f"  ❌ 检查文件失败 {f}: {e}"))
+
+            # Remove duplicates
+            for dup_file in duplicates:
+                try:
+                    dup_file.unlink()
+                    self.root.after(0, lambda f=dup_file.name:
+                                  self.log(f"  ✅ 删除重复文件: {f}"))
+                except Exception as e:
+                    errors += 1
+                    self.root.after(0, lambda f=dup_file.name, e=str(e):
+                                  self.log(f"  ❌ 删除失败 {f}: {e}"))
+
+        # Additional processing steps would go here (metadata, volume, quality)
+        # These would require additional dependencies like mutagen, ffmpeg, etc.
+
+        return processed, errors
+
+    def same_size(self, path, size):
+        """Check that an indexed file still exists with the given size"""
+        try:
+            return path.stat().st_size == size
+        except OSError:
+            return False
+
+    def toggle_watch(self):
+        """Start or stop watch mode on the source folder"""
+        if self.watcher is not None:
+            self.stop_watch()
+            return
+        if self.active_job is not None:
+            return
+
+        src_dir = Path(self.src_dir_var.get())
+        if not src_dir.exists():
+            messagebox.showerror("错误", "源文件夹不存在")
+            return
+
+        # Watch mode renames and deletes new files just like a manual run
+        if not messagebox.askyesno("确认", "确定要开始监视并自动处理新的 MP3 文件吗？建议先备份重要文件。"):
+            return
+
+        self.log_text.delete(1.0, tk.END)
+        self.watcher = MusicFolderWatcher(
+            src_dir, log=lambda m: self.root.after(0, lambda m=m: self.log(m)))
+        self.watcher.start()
+
+        self.set_active_job("watch")
+        self.watch_btn.config(text="停止监视")
+        self.progress_var.set(f"监视中 ({self.watcher.backend_name}): {src_dir}")
+        self.log(f"👀 开始监视 {src_dir} ({self.watcher.backend_name})")
+
+        thread = threading.Thread(target=self.watch_worker, args=(self.watcher, src_dir))
+        thread.daemon = True
+        thread.start()
+
+    def stop_watch(self):
+        watcher = self.watcher
+        self.watcher = None
+        watcher.stop()
+        # Stay busy until watch_worker has finished its current batch
+        self.watch_btn.config(text="停止中...", state="disabled")
+
+    def watch_finished(self):
+        """Called once watch_worker has exited"""
+        self.watch_btn.config(text="监视文件夹")
+        self.set_active_job(None)
+        self.progress_var.set("就绪")
+        self.log("⏹ 已停止监视")
+
+    def watch_worker(self, watcher, src_dir):
+        """Worker thread that processes batches handed over by the watcher"""
+        # Index existing files once; later batches only touch the new paths.
+        # Indexed files are never deleted, e.g. when their tags are edited.
+        seen_sizes = {}
+        indexed = set(self.get_mp3_files(src_dir))
+        for mp3_file in indexed:
+            try:
+                seen_sizes.setdefault(mp3_file.stat().st_size, mp3_file)
+            except OSError:
+                pass
+
+        # New names from our own renames come back as events; skip them once
+        renamed = set()
+
+        try:
+            while watcher is self.watcher:
+                batch = watcher.get_batch(max_items=8)
+                own = renamed.intersection(batch)
+                renamed.difference_update(own)
+                batch = [p for p in batch if p not in own and p.exists()]
+                if not batch:
+                    continue
+
+                self.root.after(0, lambda n=len(batch): self.log(f"\n🎵 检测到 {n} 个新文件"))
+                try:
+                    processed, errors = self.run_stages(batch, seen_sizes, indexed, renamed)
+                    self.root.after(0, lambda p=processed, e=errors:
+                                  self.log(f"✅ 批次完成! 处理: {p}, 错误: {e}"))
+                except Exception as e:
+                    self.root.after(0, lambda e=str(e): self.log(f"❌ 处理过程中发生错误: {e}"))
+        finally:
+            self.root.after(0, self.watch_finished)
+
+    def load_budget_categories(self):
+        """List category folders of the source directory for the budget combobox"""
+        src_dir = Path(self.src_dir_var.get())
+        categories = []
+        if src_dir.exists():
+            categories = sorted(item.name for item in src_dir.iterdir()
+                                if item.is_dir() and not item.name.startswith('.'))
+        self.budget_category_combo['values'] = ["全部"] + categories
+        return categories
+
+    def start_budget_plan(self):
+        """Scan the chosen categories and build a bitrate plan in a separate thread"""
+        if not has_ffmpeg():
+            messagebox.showerror("错误", "需要安装 ffmpeg (brew install ffmpeg)")
+            return
+
+        try:
+            budget = int(float(self.budget_mb.get()) * 1024 * 1024)
+        except ValueError:
+            messagebox.showerror("错误", "请输入有效的预算 (MB)")
+            return
+
+        if self.active_job is not None:
+            return
+
+        categories = self.load_budget_categories()
+        if self.budget_category.get() != "全部":
+            categories = [self.budget_category.get()]
+        if not categories:
+            messagebox.showwarning("警告", "源文件夹下没有音乐类别")
+            return
+
+        self.set_active_job("plan")
+        self.progress_var.set("扫描音轨中...")
+        self.log_text.delete(1.0, tk.END)
+
+        budgets = {category: budget for category in categories}
+        thread = threading.Thread(target=self.budget_plan_worker, args=(Path(self.src_dir_var.get()), budgets))
+        thread.daemon = True
+        thread.start()
+
+    def budget_plan_worker(self, src_dir, budgets):
+        """Worker thread for scanning and planning"""
+        try:
+            log = lambda m: self.root.after(0, lambda m=m: self.log(m))
+            plans = plan_budgets(src_dir, budgets, log=log)
+            self.root.after(0, self.show_budget_plans, plans)
+        except Exception as e:
+            self.root.after(0, lambda e=str(e): self.log(f"❌ 生成计划失败: {e}"))
+            self.root.after(0, lambda: self.progress_var.set("就绪"))
+        finally:
+            self.root.after(0, self.set_active_job, None)
+
+    def budget_plan_ready(self):
+        """Check whether any plan fits its budget and has something to transcode"""
+        return any(track["target"] for plan in self.budget_plans.values() if plan["fits"]
+                   for track in plan["tracks"])
+
+    def show_budget_plans(self, plans):
+        """Log each category's plan"""
+        self.budget_plans = plans
+        changes = 0
+        for category, plan in plans.items():
+            if plan["fits"]:
+                status = "✅"
+            else:
+                status = f"⚠️ 无法达到预算 (最低 {format_size(plan['minimum_total'])})，不会转码"
+            self.log(f"\n📁 {category}: {format_size(plan['current_total'])} → "
+                     f"{format_size(plan['projected_total'])} "
+                     f"(预算 {format_size(plan['budget'])}) {status}")
+            for track in sorted(plan["tracks"], key=lambda t: -t["duration"]):
+                minutes = track["duration"] / 60
+                loudness = f"{track['loudness']:.1f} LUFS" if track["loudness"] is not None else "-"
+                if track["target"]:
+                    changes += 1
+                    target = f"{track['bitrate']} → {track['target']} kbps"
+                else:
+                    target = f"{track['bitrate']} kbps (保持)"
+                self.log(f"  {track['path'].name}: {minutes:.1f} 分钟, {loudness}, {target}, "
+                         f"{format_size(track['size'])} → {format_size(track['projected'])}")
+
+        self.progress_var.set(f"计划完成! 需要转码: {changes}")
+
+    def start_budget_execute(self):
+        """Run the transcodes from the current plan in a separate thread"""
+        if not self.budget_plans or self.active_job is not None:
+            return
+        if not messagebox.askyesno("确认", "确定要按计划转码吗？原文件将被覆盖，建议先备份。"):
+            return
+
+        self.set_active_job("execute")
+        self.progress_var.set("转码中...")
+
+        thread = threading.Thread(target=self.budget_execute_worker, args=(self.budget_plans,))
+        thread.daemon = True
+        thread.start()
+
+    def budget_execute_worker(self, plans):
+        """Worker thread for executing budget plans"""
+        done = 0
+        errors = 0
+        log = lambda m: self.root.after(0, lambda m=m: self.log(m))
+        try:
+            for category, plan in plans.items():
+                log(f"\n⚙️ 转码 {category}...")
+                ok, failed = execute_plan(plan, log=log)
+                done += ok
+                errors += failed
+        except Exception as e:
+            log(f"❌ 转码过程中发生错误: {e}")
+        finally:
+            # The plan is stale once files were re-encoded
+            self.budget_plans = {}
+            self.root.after(0, lambda: self.progress_var.set(f"完成! 转码: {done}, 错误: {errors}"))
+            self.root.after(0, self.set_active_job, None)
 
 def main():
     root = tk.Tk()
@@ -12,8 +12,21 @@ import subprocess
 import threading
 import os
 import sys
+import json
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+from audio_tools import has_ffmpeg
+from mix_splitter import split_mix
+
+# Per-URL yt-dlp time limits (seconds); hour-long mixes need far longer to
+# download and convert than single tracks
+DOWNLOAD_TIMEOUT = 300
+MIX_DOWNLOAD_TIMEOUT = 3 * 60 * 60
+
 class YouTubeDownloaderGUI:
     def __init__(self, root):
         self.root = root
@@ -24,6 +37,9 @@ class YouTubeDownloaderGUI:
         script_dir = Path(__file__).parent.absolute()
         self.music_dir = script_dir.parent / "LofiTimer" / "Resources" / "Audio" / "music"
         
+        # Mixes are downloaded and split here, outside the watched music folder
+        self.staging_dir = script_dir / ".staging"
+        
         # Default to nujabes folder
         self.output_dir = self.music_dir / "nujabes"
         
@@ -147,6 +163,14 @@ class YouTubeDownloaderGUI:
         self.restrict_filenames = tk.BooleanVar(value=True)
         ttk.Checkbutton(meta_frame, text="安全文件名", variable=self.restrict_filenames).pack(side=tk.LEFT, padx=(20, 0))
         
+        # Mix splitting options
+        split_frame = ttk.Frame(options_frame)
+        split_frame.pack(fill=tk.X, pady=(5, 0))
+        
+        self.split_mixes = tk.BooleanVar(value=False)
+        ttk.Checkbutton(split_frame, text="拆分长混音 (按章节或静音, 需要 ffmpeg)", 
+                       variable=self.split_mixes).pack(side=tk.LEFT)
+        
         # Control buttons
         control_frame = ttk.Frame(main_frame)
         control_frame.pack(pady=15)
@@ -262,6 +286,9 @@ class YouTubeDownloaderGUI:
             self.log("请安装 yt-dlp: pip install yt-dlp")
             self.log("或者: brew install yt-dlp")
             self.download_btn.config(state="disabled")
+        
+        if not has_ffmpeg():
+            self.log("⚠️ 未找到 ffmpeg，无法拆分长混音")
     
     def log(self, message):
         """Add message to log"""
@@ -313,10 +340,12 @@ class YouTubeDownloaderGUI:
     
     def download_worker(self, urls):
         """Worker thread for downloading"""
+        # Splits run one at a time in the background while the next URL downloads
+        split_pool = ThreadPoolExecutor(max_workers=1) if self.split_mixes.get() else None
+        successful = 0
+        failed = 0
         try:
             total_urls = len(urls)
-            successful = 0
-            failed = 0
             
             for i, url in enumerate(urls, 1):
                 if not self.is_downloading:
@@ -328,12 +357,20 @@ class YouTubeDownloaderGUI:
                 # Prepare yt-dlp command
                 quality = "0" if self.quality_var.get() == "best" else self.quality_var.get()
                 
+                # When splitting, only finished tracks are moved into the category
+                job_dir = None
+                download_dir = self.output_dir
+                if split_pool is not None:
+                    self.staging_dir.mkdir(parents=True, exist_ok=True)
+                    job_dir = Path(tempfile.mkdtemp(dir=self.staging_dir))
+                    download_dir = job_dir
+                
                 cmd = [
                     "yt-dlp",
                     "--extract-audio",
                     "--audio-format", "mp3",
                     "--audio-quality", quality,
-                    "--output", f"{self.output_dir}/%(uploader)s - %(title)s.%(ext)s",
+                    "--output", f"{download_dir}/%(uploader)s - %(title)s.%(ext)s",
                     "--no-playlist",
                     "--ignore-errors",
                     url
@@ -346,11 +383,23 @@ class YouTubeDownloaderGUI:
                 if self.restrict_filenames.get():
                     cmd.append("--restrict-filenames")
                 
+                if split_pool is not None:
+                    # Print the final file path and chapter list once the MP3 is in place
+                    cmd.extend(["--print", "after_move:%(.{filepath,title,uploader,chapters})j"])
+                
+                timeout = MIX_DOWNLOAD_TIMEOUT if split_pool is not None else DOWNLOAD_TIMEOUT
+                
                 try:
-                    result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
-                    if result.returncode == 0:
+                    result = self.run_download(cmd, timeout)
+                    if result is None:
+                        self.root.after(0, lambda: self.log("⏹ 已终止当前下载"))
+                    elif result.returncode == 0:
                         successful += 1
                         self.root.after(0, lambda: self.log("✅ 下载成功"))
+                        if job_dir is not None:
+                            info = self.parse_download_info(result.stdout)
+                            split_pool.submit(self.split_worker, info, job_dir, self.output_dir)
+                            job_dir = None
                     else:
                         failed += 1
                         error_msg = result.stderr[:100] if result.stderr else "未知错误"
@@ -361,11 +410,82 @@ class YouTubeDownloaderGUI:
                 except Exception as e:
                     failed += 1
                     self.root.after(0, lambda e=str(e): self.log(f"❌ 错误: {e}"))
+                
+                if job_dir is not None:
+                    # Download failed: drop whatever yt-dlp left behind
+                    shutil.rmtree(job_dir, ignore_errors=True)
         
         finally:
+            if split_pool is not None:
+                self.root.after(0, lambda: self.progress_var.set("等待拆分完成..."))
+                split_pool.shutdown(wait=True)
             # Reset UI state
             self.root.after(0, self._download_finished, successful, failed)
     
+    def run_download(self, cmd, timeout):
+        """Run yt-dlp, killing it on timeout or when the user stops downloading
+
+        Returns the CompletedProcess, or None if the download was cancelled.
+        """
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                stdout, stderr = proc.communicate(timeout=1)
+                return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+            except subprocess.TimeoutExpired:
+                if not self.is_downloading:
+                    proc.kill()
+                    proc.communicate()
+                    return None
+                if time.monotonic() > deadline:
+                    proc.kill()
+                    proc.communicate()
+                    raise subprocess.TimeoutExpired(cmd, timeout)
+    
+    def parse_download_info(self, stdout):
+        """Return the JSON info printed by yt-dlp after the file was moved"""
+        for line in reversed(stdout.splitlines()):
+            line = line.strip()
+            if line.startswith("{"):
+                try:
+                    return json.loads(line)
+                except ValueError:
+                    continue
+        return {}
+    
+    def split_worker(self, info, job_dir, output_dir):
+        """Split a staged download and move the results into output_dir (runs on the split pool)
+
+        Short files and mixes without split points are moved over unchanged,
+        as is the original mix if splitting fails.
+        """
+        log = lambda m: self.root.after(0, lambda m=m: self.log(m))
+        try:
+            if info.get("filepath"):
+                path = Path(info["filepath"])
+                try:
+                    split_mix(path, chapters=info.get("chapters"), title=info.get("title"),
+                              artist=info.get("uploader"), log=log)
+                except Exception as e:
+                    log(f"❌ 拆分失败 {path.name}: {e}")
+            
+            for track in sorted(job_dir.glob("*.mp3")):
+                self.move_into(track, output_dir)
+            shutil.rmtree(job_dir, ignore_errors=True)
+        except Exception as e:
+            # Leave the staged files in place so nothing is lost
+            log(f"❌ 移动文件失败: {e} (文件保留在 {job_dir})")
+    
+    def move_into(self, path, directory):
+        """Move a finished track into directory without overwriting anything"""
+        dest = directory / path.name
+        counter = 1
+        while dest.exists():
+            dest = directory / f"{path.stem}_{counter}{path.suffix}"
+            counter += 1
+        shutil.move(str(path), str(dest))
+    
     def _download_finished(self, successful, failed):
         """Called when download is finished"""
         self.is_downloading = False